@@ -3,19 +3,28 @@
 Browser Setup and Authentication Module
 """
 
+import os
+import re
 import time
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from core_scraper import *
 
+_LOGGED_IN_RE = re.compile(r'logout|profile|settings', re.IGNORECASE)
+
 # ============================================================
 # BROWSER SETUP
 # ============================================================
 
-def setup_browser():
+def setup_browser(profile_slot=0):
     """Setup Chrome browser"""
     try:
         print("\n🔧 Setting up browser...")
@@ -30,7 +39,18 @@ def setup_browser():
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
-        options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        options.add_argument(f"user-agent={USER_AGENT}")
+        
+        # Persistent profile keeps the session between runs; one per concurrent browser
+        options.add_argument(f"--user-data-dir={os.path.join(CHROME_PROFILE_DIR, str(profile_slot))}")
+        
+        # Return from driver.get once the DOM is ready; sub-resources are never read
+        options.page_load_strategy = 'eager'
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.stylesheets": 2,
+            "profile.managed_default_content_settings.fonts": 2
+        })
         
         driver = webdriver.Chrome(options=options)
         driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
@@ -43,7 +63,7 @@ def setup_browser():
         print(f"  ❌ Browser setup failed: {e}")
         return None
 
-def restart_browser(driver):
+def restart_browser(driver, profile_slot=0):
     """Restart browser on crash"""
     try:
         if driver:
@@ -51,12 +71,167 @@ def restart_browser(driver):
     except:
         pass
     time.sleep(2)
-    return setup_browser()
+    return setup_browser(profile_slot)
+
+class DriverPool:
+    """Pool of logged-in browsers shared by scraping workers, launched on first use"""
+    
+    def __init__(self, size=DRIVER_POOL_SIZE):
+        self.size = max(1, size)
+        self.drivers = queue.Queue()
+        self.lock = threading.Lock()
+        self.active = []
+        self.slots = {}
+        self.launched = 0
+        self.cookies_valid = False
+        self.http_session = None
+    
+    def start(self):
+        """Prepare a logged-in HTTP session, returns False when no login is possible"""
+        self.cookies_valid = probe_saved_cookies()
+        if self.cookies_valid:
+            self.http_session = create_http_session(read_cookies())
+            return True
+        
+        # No usable saved session: log one browser in now, the rest launch when needed
+        driver = self.launch()
+        if not driver:
+            return False
+        # Its login saved the cookie file, later browsers install it through CDP
+        self.cookies_valid = True
+        self.drivers.put(driver)
+        return True
+    
+    def launch(self):
+        """Start and log in the next browser slot, None when all slots are used or it fails"""
+        with self.lock:
+            if self.launched >= self.size:
+                return None
+            slot = self.launched
+            self.launched += 1
+        
+        log_msg(f"🌐 Starting browser {slot + 1}/{self.size}")
+        driver = setup_browser(slot)
+        logged_in = driver and (apply_saved_cookies(driver) if self.cookies_valid else login_to_damadam(driver))
+        if not logged_in:
+            self.discard(driver)
+            return None
+        
+        with self.lock:
+            self.active.append(driver)
+            self.slots[driver] = slot
+            if not self.http_session:
+                self.http_session = create_http_session(browser_cookies(driver))
+        return driver
+    
+    def acquire(self):
+        """Borrow a browser, launching one if needed; None once every browser is gone"""
+        while True:
+            try:
+                return self.drivers.get_nowait()
+            except queue.Empty:
+                pass
+            driver = self.launch()
+            if driver:
+                return driver
+            with self.lock:
+                if not self.active and self.launched >= self.size:
+                    return None
+            try:
+                return self.drivers.get(timeout=5)
+            except queue.Empty:
+                continue
+    
+    def release(self, driver):
+        """Return a browser to the pool"""
+        if driver:
+            self.drivers.put(driver)
+    
+    def restart(self, driver):
+        """Replace a crashed browser, returns the new one or None"""
+        with self.lock:
+            if driver in self.active:
+                self.active.remove(driver)
+            slot = self.slots.pop(driver, 0)
+        new_driver = restart_browser(driver, slot)
+        if new_driver and login_to_damadam(new_driver, trust_fresh_cookies=False):
+            with self.lock:
+                self.active.append(new_driver)
+                self.slots[new_driver] = slot
+            return new_driver
+        self.discard(new_driver)
+        return None
+    
+    def discard(self, driver):
+        """Quit a browser that is not (or no longer) pooled"""
+        try:
+            if driver:
+                driver.quit()
+        except:
+            pass
+    
+    def close(self):
+        """Quit every pooled browser"""
+        with self.lock:
+            drivers, self.active = self.active, []
+            self.slots = {}
+        for driver in drivers:
+            self.discard(driver)
+
+def browser_cookies(driver):
+    """Every cookie in the browser's jar, including ones set through CDP before any page load"""
+    return driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+
+def create_http_session(cookies):
+    """Keep-alive HTTP session carrying the login cookies"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=DRIVER_POOL_SIZE, pool_maxsize=DRIVER_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+    return session
 
 # ============================================================
 # AUTHENTICATION
 # ============================================================
 
+def probe_saved_cookies():
+    """Check saved cookies against an authenticated page without a browser"""
+    cookies = read_cookies()
+    if not cookies:
+        return False
+    try:
+        response = requests.get(
+            "https://damadam.pk/settings/",
+            cookies={cookie['name']: cookie['value'] for cookie in cookies},
+            headers={"User-Agent": USER_AGENT},
+            allow_redirects=False,
+            timeout=5
+        )
+        valid = response.status_code == 200 and bool(LOGOUT_RE.search(response.text))
+        log_msg(f"🍪 Saved cookies {'valid' if valid else 'expired'}")
+        return valid
+    except Exception as e:
+        log_msg(f"⚠️ Cookie probe failed: {e}")
+        return False
+
+def apply_saved_cookies(driver):
+    """Install saved cookies through CDP, no page load needed"""
+    try:
+        cookies = []
+        for cookie in read_cookies():
+            params = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite') if key in cookie}
+            if 'expiry' in cookie:
+                params['expires'] = cookie['expiry']
+            cookies.append(params)
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+        log_msg(f"🍪 Applied {len(cookies)} saved cookies")
+        return True
+    except Exception as e:
+        log_msg(f"⚠️ Failed to apply cookies: {e}")
+        return False
+
 def login_with_credentials(driver, username, password, account_name):
     """Login with credentials"""
     try:
@@ -76,15 +251,17 @@ def login_with_credentials(driver, username, password, account_name):
                 submit_btn = driver.find_element(By.CSS_SELECTOR, sel["button"])
                 
                 nick_field.clear()
-                time.sleep(0.5)
                 nick_field.send_keys(username)
                 
                 pass_field.clear()
-                time.sleep(0.5)
                 pass_field.send_keys(password)
                 
+                login_url = driver.current_url
                 submit_btn.click()
-                time.sleep(4)
+                try:
+                    WebDriverWait(driver, 10).until(EC.url_changes(login_url))
+                except TimeoutException:
+                    pass
                 
                 if "login" not in driver.current_url.lower():
                     log_msg(f"✅ {account_name} login successful")
@@ -100,26 +277,35 @@ def login_with_credentials(driver, username, password, account_name):
         log_msg(f"❌ {account_name} login error: {e}")
         return False
 
-def login_to_damadam(driver):
+def login_to_damadam(driver, trust_fresh_cookies=True):
     """Login to DamaDam"""
     try:
         print("\n🔐 Logging in...")
         
         driver.get("https://damadam.pk/")
-        time.sleep(2)
         
+        fresh = trust_fresh_cookies and cookies_fresh()
         if load_cookies(driver):
+            # Recently saved session: one authenticated HTTP check instead of a browser refresh
+            if fresh and probe_saved_cookies():
+                print("  ✅ Login via fresh cookies")
+                return True
+            
             driver.refresh()
-            time.sleep(3)
+            try:
+                WebDriverWait(driver, 5).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='logout'], form[action*='logout']"))
+                )
+            except TimeoutException:
+                pass
             
             if "login" not in driver.current_url.lower():
-                page_source = driver.page_source.lower()
-                if any(indicator in page_source for indicator in ['logout', 'profile', 'settings']):
+                if _LOGGED_IN_RE.search(driver.page_source):
                     print("  ✅ Login via cookies")
+                    save_cookies(driver)
                     return True
         
         driver.get(LOGIN_URL)
-        time.sleep(3)
         
         if USERNAME and PASSWORD:
             if login_with_credentials(driver, USERNAME, PASSWORD, "Account 1"):
@@ -128,7 +314,6 @@ def login_to_damadam(driver):
         if USERNAME_2 and PASSWORD_2:
             log_msg("Trying Account 2...")
             driver.get(LOGIN_URL)
-            time.sleep(3)
             if login_with_credentials(driver, USERNAME_2, PASSWORD_2, "Account 2"):
                 return True
         
@@ -10,7 +10,10 @@ import time
 import random
 import re
 import json
+import threading
 from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
 
 # Load environment variables
@@ -25,7 +28,10 @@ except ImportError:
 required_packages = {
     'selenium': 'selenium',
     'gspread': 'gspread',
-    'google.auth': 'google-auth'
+    'google.auth': 'google-auth',
+    'requests': 'requests',
+    'lxml': 'lxml',
+    'cssselect': 'cssselect'
 }
 
 missing_packages = []
@@ -57,7 +63,8 @@ from google.oauth2.service_account import Credentials
 # ============================================================
 
 LOGIN_URL = "https://damadam.pk/login/"
-COOKIE_FILE = "damadam_cookies.pkl"
+COOKIE_FILE = "damadam_cookies.json"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 # Environment Variables
 USERNAME = os.getenv('DAMADAM_USERNAME')
@@ -73,7 +80,12 @@ BATCH_SIZE = int(os.getenv('BATCH_SIZE', '20'))
 MIN_DELAY = float(os.getenv('MIN_DELAY', '0.4'))
 MAX_DELAY = float(os.getenv('MAX_DELAY', '0.6'))
 PAGE_LOAD_TIMEOUT = int(os.getenv('PAGE_LOAD_TIMEOUT', '30'))
-SHEET_WRITE_DELAY = float(os.getenv('SHEET_WRITE_DELAY', '0.8'))
+SHEET_BATCH_ROWS = int(os.getenv('SHEET_BATCH_ROWS', '500'))
+SHEET_WRITES_PER_MINUTE = int(os.getenv('SHEET_WRITES_PER_MINUTE', '55'))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '25'))
+DRIVER_POOL_SIZE = int(os.getenv('DRIVER_POOL_SIZE', '3'))
+COOKIE_MAX_AGE = int(os.getenv('COOKIE_MAX_AGE', '3600'))
+CHROME_PROFILE_DIR = os.path.expanduser(os.getenv('CHROME_PROFILE_DIR', '~/.damadam_chrome_profile'))
 
 # Sheet Structure
 COLUMN_ORDER = [
@@ -86,8 +98,78 @@ COLUMN_TO_INDEX = {name: idx for idx, name in enumerate(COLUMN_ORDER)}
 LOG_SHEET_NAME = "Logs"
 LOG_HEADERS = ["Timestamp", "Nickname", "Change Type", "Fields", "Before", "After"]
 DASHBOARD_SHEET_NAME = "Dashboard"
+FORMAT_METADATA_KEY = "profiles_format"
+FORMAT_VERSION = "fmt_v1"  # Bump when format_profiles_sheet changes
 HIGHLIGHT_EXCLUDE_COLUMNS = {"IMAGE", "LAST POST", "JOINED", "PROFILE LINK", "SOURCE", "DATETIME SCRAP"}
 LINK_COLUMNS = {"IMAGE", "LAST POST", "PROFILE LINK"}
+LINK_FORMULAS = {
+    "IMAGE": '=IMAGE("{}", 4, 50, 50)',
+    "LAST POST": '=HYPERLINK("{}", "Post")',
+    "PROFILE LINK": '=HYPERLINK("{}", "Profile")'
+}
+
+_PROFILE_ATTRS = tuple(col.replace(' ', '_') for col in COLUMN_ORDER)
+
+@dataclass(slots=True)
+class ProfileRow:
+    """One scraped profile, one attribute per COLUMN_ORDER entry (spaces as underscores)"""
+    IMAGE: str = ''
+    NICK_NAME: str = ''
+    TAGS: str = ''
+    LAST_POST: str = ''
+    LAST_POST_TIME: str = ''
+    FRIEND: str = ''
+    CITY: str = ''
+    GENDER: str = ''
+    MARRIED: str = ''
+    AGE: str = ''
+    JOINED: str = ''
+    FOLLOWERS: str = ''
+    STATUS: str = ''
+    POSTS: str = ''
+    PROFILE_LINK: str = ''
+    INTRO: str = ''
+    SOURCE: str = ''
+    DATETIME_SCRAP: str = ''
+    
+    def __getitem__(self, col):
+        return getattr(self, col.replace(' ', '_'))
+    
+    def __setitem__(self, col, value):
+        setattr(self, col.replace(' ', '_'), value)
+    
+    def get(self, col, default=''):
+        return getattr(self, col.replace(' ', '_'), default)
+    
+    def update(self, fields):
+        for col, value in fields.items():
+            self[col] = value
+    
+    def to_row(self):
+        """Values in COLUMN_ORDER"""
+        return [getattr(self, attr) for attr in _PROFILE_ATTRS]
+
+# Precompiled text patterns
+_WHITESPACE_RE = re.compile(r'\s+')
+_BLANK_VALUES = frozenset({
+    "no city", "not set", "[no posts]", "n/a", "[no post url]",
+    "[error]", "no set", "none", "null", "no age"
+})
+_ABBREV_PATTERNS = [
+    (re.compile(r"\bsecs?\b", re.IGNORECASE), "seconds"),
+    (re.compile(r"\bmins?\b", re.IGNORECASE), "minutes"),
+    (re.compile(r"\bhrs?\b", re.IGNORECASE), "hours"),
+    (re.compile(r"\bwks?\b", re.IGNORECASE), "weeks"),
+    (re.compile(r"\byrs?\b", re.IGNORECASE), "years"),
+    (re.compile(r"\bmon(s)?\b", re.IGNORECASE), "months"),
+]
+_SPECIAL_RE = re.compile(r"(just now|now)|(yesterday)", re.IGNORECASE)
+_AA_RE = re.compile(r"\b(a|an)\s+(second|minute|hour|day|week|month|year)s?\s*ago\b", re.IGNORECASE)
+_STD_RE = re.compile(r"(\d+)\s*(second|minute|hour|day|week|month|year)s?\s*ago", re.IGNORECASE)
+_ABS_PREFIXES = ('http://', 'https://')
+
+# Only pages served to a logged-in member carry a logout link
+LOGOUT_RE = re.compile(r'logout', re.IGNORECASE)
 
 # Validate environment
 required_env = ['DAMADAM_USERNAME', 'DAMADAM_PASSWORD', 'GOOGLE_SHEET_URL', 'GOOGLE_CREDENTIALS_JSON']
@@ -113,62 +195,48 @@ def log_msg(message):
 
 def clean_text(text):
     """Clean text"""
-    if not text:
-        return ""
-    text = str(text).strip().replace('\xa0', ' ').replace('\n', ' ')
-    return re.sub(r'\s+', ' ', text).strip()
+    # \s covers \xa0 and newlines, so one pass collapses all whitespace
+    return _WHITESPACE_RE.sub(' ', str(text)).strip() if text else ""
 
 def clean_data(value):
     """Clean data by removing unwanted values"""
     if not value:
         return ""
     value = str(value).strip()
-    replace_with_blank = [
-        "No city", "Not set", "[No Posts]", "N/A",
-        "no city", "not set", "[no posts]", "n/a",
-        "[No Post URL]", "[Error]", "no set", "none", "null", "no age"
-    ]
-    return "" if value in replace_with_blank else value
+    return "" if value.lower() in _BLANK_VALUES else value
 
-def convert_relative_date_to_absolute(relative_text):
+def convert_relative_date_to_absolute(relative_text, now=None):
     """Convert '2 months ago' to 'dd-mmm-yy'"""
     if not relative_text:
         return ""
     
-    relative_text = relative_text.lower().strip()
-    now = get_pkt_time()
+    relative_text = relative_text.strip()
+    now = now or get_pkt_time()
     
     try:
         # Normalize common abbreviations
-        abbrev_map = {
-            r"\bsecs?\b": "seconds",
-            r"\bmins?\b": "minutes",
-            r"\bhrs?\b": "hours",
-            r"\bwks?\b": "weeks",
-            r"\byrs?\b": "years",
-            r"\bmon(s)?\b": "months",
-        }
-        for pat, repl in abbrev_map.items():
-            relative_text = re.sub(pat, repl, relative_text)
+        for pat, repl in _ABBREV_PATTERNS:
+            relative_text = pat.sub(repl, relative_text)
 
         # Handle special phrases
-        if relative_text in {"just now", "now"}:
+        special = _SPECIAL_RE.fullmatch(relative_text)
+        if special and special.group(1):
             return now.strftime("%d-%b-%y")
-        if relative_text == "yesterday":
+        if special:
             return (now - timedelta(days=1)).strftime("%d-%b-%y")
 
         # Support 'a/an <unit> ago'
-        aa = re.search(r"\b(a|an)\s+(second|minute|hour|day|week|month|year)s?\s*ago\b", relative_text)
+        aa = _AA_RE.search(relative_text)
         if aa:
             amount = 1
-            unit = aa.group(2)
+            unit = aa.group(2).lower()
         else:
             # Standard '<num> <unit> ago'
-            match = re.search(r"(\d+)\s*(second|minute|hour|day|week|month|year)s?\s*ago", relative_text)
+            match = _STD_RE.search(relative_text)
             if not match:
-                return relative_text
+                return relative_text.lower()
             amount = int(match.group(1))
-            unit = match.group(2)
+            unit = match.group(2).lower()
 
         delta_map = {
             'second': timedelta(seconds=amount),
@@ -183,56 +251,76 @@ def convert_relative_date_to_absolute(relative_text):
         if unit in delta_map:
             target_date = now - delta_map[unit]
             return target_date.strftime("%d-%b-%y")
-        return relative_text
+        return relative_text.lower()
     except:
-        return relative_text
+        return relative_text.lower()
 
-def parse_post_timestamp(timestamp_text):
+def parse_post_timestamp(timestamp_text, now=None):
     """Parse post timestamp to 'DD-MMM-YY'"""
-    return convert_relative_date_to_absolute(timestamp_text)
+    return convert_relative_date_to_absolute(timestamp_text, now)
 
+@lru_cache(maxsize=4096)
 def to_absolute_url(href):
     """Ensure URLs are absolute"""
     if not href:
         return ""
     href = href.strip()
+    if href.startswith(_ABS_PREFIXES):
+        return href
     if href.startswith('/'):
         return f"https://damadam.pk{href}"
-    elif not href.startswith('http'):
-        return f"https://damadam.pk/{href}"
-    return href
+    return f"https://damadam.pk/{href}"
 
-def column_letter(col_idx):
-    """Convert column index to letter (A, B, C, ...)"""
-    result = ""
+def _column_letter_impl(col_idx):
+    """Convert column index to letter without the lookup table"""
+    chars = []
     col_idx += 1
     while col_idx > 0:
-        col_idx -= 1
-        result = chr(col_idx % 26 + ord('A')) + result
-        col_idx //= 26
-    return result
+        col_idx, rem = divmod(col_idx - 1, 26)
+        chars.append(chr(rem + ord('A')))
+    return ''.join(reversed(chars))
+
+_COL_LETTERS = tuple(_column_letter_impl(i) for i in range(len(COLUMN_ORDER)))
+
+def column_letter(col_idx):
+    """Convert column index to letter (A, B, C, ...)"""
+    if col_idx < len(_COL_LETTERS):
+        return _COL_LETTERS[col_idx]
+    return _column_letter_impl(col_idx)
 
 def save_cookies(driver, filepath=COOKIE_FILE):
     """Save browser cookies"""
     try:
-        import pickle
-        with open(filepath, 'wb') as f:
-            pickle.dump(driver.get_cookies(), f)
+        with open(filepath, 'w') as f:
+            json.dump(driver.get_cookies(), f)
         log_msg(f"💾 Cookies saved to {filepath}")
         return True
     except Exception as e:
         log_msg(f"⚠️ Failed to save cookies: {e}")
         return False
 
+def cookies_fresh(filepath=COOKIE_FILE):
+    """Check if the cookie file was saved within COOKIE_MAX_AGE"""
+    try:
+        return os.path.getmtime(filepath) > time.time() - COOKIE_MAX_AGE
+    except OSError:
+        return False
+
+def read_cookies(filepath=COOKIE_FILE):
+    """Read saved cookies, empty list when missing or unreadable"""
+    try:
+        with open(filepath) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
 def load_cookies(driver, filepath=COOKIE_FILE):
     """Load cookies from file"""
     try:
-        import pickle
         if not os.path.exists(filepath):
             return False
         
-        with open(filepath, 'rb') as f:
-            cookies = pickle.load(f)
+        cookies = read_cookies(filepath)
         
         for cookie in cookies:
             try:
@@ -265,6 +353,94 @@ def calculate_eta(processed, total, start_time):
         minutes = int((eta_seconds % 3600) / 60)
         return f"{hours}h {minutes}m"
 
+class RequestPacer:
+    """Space requests to damadam.pk by MIN_DELAY..MAX_DELAY across all worker threads,
+    with an extra pause after every BATCH_SIZE profiles"""
+    
+    def __init__(self, min_delay=MIN_DELAY, max_delay=MAX_DELAY, batch_size=BATCH_SIZE, batch_pause=5):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+        self.profiles = 0
+    
+    def wait(self, new_profile=False):
+        """Block until this caller's turn; turns are handed out one gap apart"""
+        with self.lock:
+            now = time.monotonic()
+            turn = max(now, self.next_at)
+            if new_profile:
+                if self.batch_size > 0 and self.profiles and self.profiles % self.batch_size == 0:
+                    log_msg(f"⏸️ Batch pause (started {self.profiles} profiles)")
+                    turn += self.batch_pause
+                self.profiles += 1
+            self.next_at = turn + random.uniform(self.min_delay, self.max_delay)
+        if turn > now:
+            time.sleep(turn - now)
+
+# ============================================================
+# BATCHED SHEET WRITES
+# ============================================================
+
+def quote_literal(value):
+    """Quote prefix so USER_ENTERED stores the value as plain text"""
+    return f"'{value}" if value else ""
+
+class SheetWriter:
+    """Buffer appended rows and extra ranges for one worksheet"""
+    
+    def __init__(self, worksheet, chunk_size=SHEET_BATCH_ROWS):
+        self.worksheet = worksheet
+        self.chunk_size = chunk_size
+        self.appends = []
+        self.ranges = []
+    
+    def __len__(self):
+        return len(self.appends) + len(self.ranges)
+    
+    def queue_append(self, row_values):
+        """Queue a full row of USER_ENTERED values for the end of the sheet"""
+        self.appends.append(row_values)
+    
+    def queue_range(self, range_name, values, worksheet=None):
+        """Queue values for an existing range, on any worksheet of the spreadsheet"""
+        title = (worksheet or self.worksheet).title
+        self.ranges.append({'range': f"'{title}'!{range_name}", 'values': values})
+    
+    def send(self, data):
+        """One spreadsheet-level values.batchUpdate for sheet-qualified ranges"""
+        return self.worksheet.spreadsheet.values_batch_update({
+            "valueInputOption": "USER_ENTERED",
+            "data": data
+        })
+    
+    def flush(self, call=None):
+        """Send queued writes one request at a time, returns number of entries written.
+        
+        Every request goes through call(func, *args, **kwargs), e.g. a retry wrapper
+        returning None on failure. Entries leave the queue only once their own request
+        succeeded, so a later flush resends just what is still unsent.
+        """
+        call = call or (lambda func, *args, **kwargs: func(*args, **kwargs))
+        written = 0
+        
+        # Appends first so statuses never point at rows that were not written
+        while self.appends:
+            chunk = self.appends[:self.chunk_size]
+            if call(self.worksheet.append_rows, chunk, value_input_option='USER_ENTERED', table_range='A1') is None:
+                return written
+            del self.appends[:len(chunk)]
+            written += len(chunk)
+        
+        if self.ranges:
+            if call(self.send, self.ranges) is None:
+                return written
+            written += len(self.ranges)
+            self.ranges.clear()
+        return written
+
 # ============================================================
 # GOOGLE SHEETS SETUP
 # ============================================================
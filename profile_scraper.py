@@ -3,47 +3,172 @@
 Profile Scraping Module
 """
 
-import time
 import re
+from urllib.parse import urlparse
+from lxml import html
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from core_scraper import *
 
+_DIGITS_RE = re.compile(r'(\d+)')
+_TEXT_COMMENT_RE = re.compile(r'/comments/text/(\d+)/')
+_IMAGE_COMMENT_RE = re.compile(r'/comments/image/(\d+)/')
+
+# Every status/friend marker in one pass; group order decides overlapping matches
+_MARKER_RE = re.compile(
+    r'(?P<suspended>account suspended)'
+    r'|(?P<unverified>background:tomato|<div[^>]*\bstyle=["\'][^"\']*tomato)'
+    r'|(?P<friend>action="/follow/remove/"|unfollow\.svg)'
+    r'|(?P<unfollow>unfollow)'
+    r'|(?P<follow>follow\.svg)',
+    re.IGNORECASE
+)
+
 # ============================================================
 # PROFILE SCRAPING
 # ============================================================
 
-def get_friend_status(driver):
+PROFILE_FIELDS = {'City:': 'CITY', 'Gender:': 'GENDER', 'Married:': 'MARRIED', 'Age:': 'AGE', 'Joined:': 'JOINED'}
+INTRO_SELECTORS = ["span.cl.sp.lsp.nos", "span.cl", ".ow span.nos"]
+FOLLOWERS_SELECTORS = ["span.cl.sp.clb", ".cl.sp.clb"]
+POSTS_SELECTORS = ["a[href*='/profile/public/'] button div:first-child", "a[href*='/profile/public/'] button div"]
+IMAGE_SELECTORS = ["img[src*='avatar-imgs']", "img[src*='avatar']", "div[style*='whitesmoke'] img[src*='cloudfront.net']"]
+
+def get_page_markers(page_source):
+    """Names of the status/friend markers present in the page"""
+    return {match.lastgroup for match in _MARKER_RE.finditer(page_source)}
+
+def get_friend_status(markers):
     """Check friend status"""
-    try:
-        page_source = driver.page_source.lower()
-        if 'action="/follow/remove/"' in page_source or 'unfollow.svg' in page_source:
-            return "Yes"
-        if 'follow.svg' in page_source and 'unfollow' not in page_source:
-            return "No"
-        return ""
-    except:
-        return ""
+    if 'friend' in markers:
+        return "Yes"
+    if 'follow' in markers and 'unfollow' not in markers:
+        return "No"
+    return ""
+
+def get_account_status(markers):
+    """Detect suspended / unverified accounts"""
+    if 'suspended' in markers:
+        return "Suspended"
+    if 'unverified' in markers:
+        return "Unverified"
+    return "Verified"
+
+def first_text(tree, selectors, pattern=None):
+    """Text of the first element matched by the selectors, optionally matching a pattern"""
+    for sel in selectors:
+        elems = tree.cssselect(sel)
+        if not elems:
+            continue
+        text = elems[0].text_content().strip()
+        if text and (not pattern or pattern.search(text)):
+            return text
+    return ""
+
+def parse_profile_fields(page_source, now=None):
+    """Parse profile fields from a rendered profile page"""
+    tree = html.fromstring(page_source)
+    markers = get_page_markers(page_source)
+    fields = {
+        'STATUS': get_account_status(markers),
+        'FRIEND': get_friend_status(markers),
+        'INTRO': clean_text(first_text(tree, INTRO_SELECTORS))
+    }
+    
+    # Profile fields
+    for field_text, key in PROFILE_FIELDS.items():
+        elems = tree.xpath(f"//b[contains(text(), '{field_text}')]/following-sibling::span[1]")
+        value = elems[0].text_content().strip() if elems else ""
+        if not value:
+            continue
+        if key == 'JOINED':
+            fields[key] = convert_relative_date_to_absolute(value, now)
+        elif key == 'GENDER':
+            fields[key] = "💃" if value.lower() == 'female' else "🕺" if value.lower() == 'male' else value
+        elif key == 'MARRIED':
+            if value.lower() in ['yes', 'married']:
+                fields[key] = "💍"
+            elif value.lower() in ['no', 'single', 'unmarried']:
+                fields[key] = "❎"
+            else:
+                fields[key] = value
+        else:
+            fields[key] = clean_data(value)
+    
+    # Followers / posts count
+    for key, selectors in (('FOLLOWERS', FOLLOWERS_SELECTORS), ('POSTS', POSTS_SELECTORS)):
+        match = _DIGITS_RE.search(first_text(tree, selectors, _DIGITS_RE))
+        if match:
+            fields[key] = match.group(1)
+    
+    # Profile image
+    for sel in IMAGE_SELECTORS:
+        imgs = tree.cssselect(sel)
+        src = to_absolute_url(imgs[0].get('src', '')) if imgs else ""
+        if src and ('avatar' in src or 'cloudfront.net' in src):
+            fields['IMAGE'] = src.replace('/thumbnail/', '/')
+            break
+    
+    # Latest post, when the profile page already embeds it
+    articles = tree.cssselect("article.mbl")
+    if articles:
+        post_data = parse_recent_post(articles[0], now)
+        fields['LAST POST'] = clean_data(post_data['LPOST'])
+        fields['LAST POST TIME'] = post_data.get('LDATE-TIME', '')
+    
+    return fields
 
 def extract_text_comment_url(href):
     """Extract text comment URL"""
-    pattern = r'/comments/text/(\d+)/'
-    match = re.search(pattern, href)
+    match = _TEXT_COMMENT_RE.search(href)
     if match:
         return to_absolute_url(f"/comments/text/{match.group(1)}/").rstrip('/')
     return to_absolute_url(href)
 
 def extract_image_comment_url(href):
     """Extract image comment URL"""
-    pattern = r'/comments/image/(\d+)/'
-    match = re.search(pattern, href)
+    match = _IMAGE_COMMENT_RE.search(href)
     if match:
         return to_absolute_url(f"/content/{match.group(1)}/g/")
     return to_absolute_url(href)
 
-def scrape_recent_post(driver, nickname):
+def parse_recent_post(recent_post, now=None):
+    """Parse post URL and timestamp from an article element"""
+    post_data = {'LPOST': '', 'LDATE-TIME': ''}
+    
+    url_selectors = [
+        ("a[href*='/content/']", lambda h: to_absolute_url(h)),
+        ("a[href*='/comments/text/']", extract_text_comment_url),
+        ("a[href*='/comments/image/']", extract_image_comment_url)
+    ]
+    
+    for selector, formatter in url_selectors:
+        links = recent_post.cssselect(selector)
+        href = links[0].get('href') if links else None
+        if href:
+            formatted = formatter(href)
+            if formatted:
+                post_data['LPOST'] = formatted
+                break
+    
+    time_selectors = [
+        "span[itemprop='datePublished']",
+        "time[itemprop='datePublished']",
+        "span.cxs.cgy",
+        "time"
+    ]
+    for sel in time_selectors:
+        elems = recent_post.cssselect(sel)
+        text = elems[0].text_content().strip() if elems else ""
+        if text:
+            post_data['LDATE-TIME'] = parse_post_timestamp(text, now)
+            break
+    
+    return post_data
+
+def scrape_recent_post(driver, nickname, now=None):
     """Scrape recent post"""
     post_url = f"https://damadam.pk/profile/public/{nickname}"
     try:
@@ -56,46 +181,77 @@ def scrape_recent_post(driver, nickname):
         except TimeoutException:
             return {'LPOST': '', 'LDATE-TIME': ''}
         
-        recent_post = driver.find_element(By.CSS_SELECTOR, "article.mbl")
-        post_data = {'LPOST': '', 'LDATE-TIME': ''}
+        tree = html.fromstring(driver.page_source)
+        return parse_recent_post(tree.cssselect("article.mbl")[0], now)
+    
+    except Exception as e:
+        return {'LPOST': '', 'LDATE-TIME': ''}
+
+def get_logged_in(session, url):
+    """GET a page over HTTP, None when the site redirected to login or served the logged-out page"""
+    response = session.get(url, timeout=PAGE_LOAD_TIMEOUT)
+    if urlparse(response.url).path.startswith('/login'):
+        return None
+    if response.status_code == 200 and not LOGOUT_RE.search(response.text):
+        return None
+    return response
+
+def fill_recent_post(data, fetch_post):
+    """Recent post, only when the profile page did not include it; False when fetch_post gives None"""
+    if data['POSTS'] and data['POSTS'] != '0' and not data['LAST POST']:
+        post_data = fetch_post()
+        if post_data is None:
+            return False
+        data['LAST POST'] = clean_data(post_data['LPOST'])
+        data['LAST POST TIME'] = post_data.get('LDATE-TIME', '')
+    return True
+
+def new_profile_data(nickname, url, now):
+    """Empty profile record for a nickname"""
+    return ProfileRow(
+        NICK_NAME=nickname,
+        DATETIME_SCRAP=now.strftime("%d-%b-%y %I:%M %p"),
+        PROFILE_LINK=url
+    )
+
+def scrape_profile_http(session, nickname):
+    """Scrape profile over plain HTTP, None when the browser path is needed"""
+    url = f"https://damadam.pk/users/{nickname}/"
+    try:
+        log_msg(f"📍 Scraping (HTTP): {nickname}")
+        # Logged-out pages lack member-only fields such as FRIEND
+        response = get_logged_in(session, url)
+        if response is None:
+            log_msg(f"⚠️ HTTP session not logged in, {nickname} goes to a browser")
+            return None
+        if response.status_code != 200:
+            return None
+        
+        page_source = response.text
+        if not html.fromstring(page_source).cssselect("h1.cxl.clb.lsp"):
+            return None
         
-        url_selectors = [
-            ("a[href*='/content/']", lambda h: to_absolute_url(h)),
-            ("a[href*='/comments/text/']", extract_text_comment_url),
-            ("a[href*='/comments/image/']", extract_image_comment_url)
-        ]
+        now = get_pkt_time()
+        data = new_profile_data(nickname, url, now)
+        data.update(parse_profile_fields(page_source, now))
         
-        for selector, formatter in url_selectors:
-            try:
-                link = recent_post.find_element(By.CSS_SELECTOR, selector)
-                href = link.get_attribute('href')
-                if href:
-                    formatted = formatter(href)
-                    if formatted:
-                        post_data['LPOST'] = formatted
-                        break
-            except:
-                continue
+        def fetch_post():
+            response = get_logged_in(session, f"https://damadam.pk/profile/public/{nickname}")
+            if response is None:
+                return None
+            articles = html.fromstring(response.text).cssselect("article.mbl") if response.status_code == 200 else []
+            return parse_recent_post(articles[0], now) if articles else {'LPOST': '', 'LDATE-TIME': ''}
         
-        time_selectors = [
-            "span[itemprop='datePublished']",
-            "time[itemprop='datePublished']",
-            "span.cxs.cgy",
-            "time"
-        ]
-        for sel in time_selectors:
-            try:
-                time_elem = recent_post.find_element(By.CSS_SELECTOR, sel)
-                if time_elem.text.strip():
-                    post_data['LDATE-TIME'] = parse_post_timestamp(time_elem.text.strip())
-                    break
-            except:
-                continue
+        if not fill_recent_post(data, fetch_post):
+            log_msg(f"⚠️ HTTP session not logged in, {nickname} goes to a browser")
+            return None
         
-        return post_data
+        log_msg(f"✅ Extracted: {data['GENDER']}, {data['CITY']}, Posts: {data['POSTS']}")
+        return data
     
     except Exception as e:
-        return {'LPOST': '', 'LDATE-TIME': ''}
+        log_msg(f"⚠️ HTTP scrape failed for {nickname}: {str(e)[:50]}")
+        return None
 
 def scrape_profile(driver, nickname):
     """Scrape profile"""
@@ -107,116 +263,13 @@ def scrape_profile(driver, nickname):
             EC.presence_of_element_located((By.CSS_SELECTOR, "h1.cxl.clb.lsp"))
         )
         
-        page_source = driver.page_source
         now = get_pkt_time()
+        data = new_profile_data(nickname, url, now)
         
-        data = {
-            'NICK NAME': nickname,
-            'DATETIME SCRAP': now.strftime("%d-%b-%y %I:%M %p"),
-            'PROFILE LINK': url,
-            'TAGS': '',
-            'CITY': '',
-            'GENDER': '',
-            'MARRIED': '',
-            'AGE': '',
-            'JOINED': '',
-            'FOLLOWERS': '',
-            'POSTS': '',
-            'LAST POST': '',
-            'LAST POST TIME': '',
-            'IMAGE': '',
-            'INTRO': '',
-            'STATUS': '',
-            'FRIEND': ''
-        }
-        
-        # Status detection
-        if 'Account suspended' in page_source or 'account suspended' in page_source.lower():
-            data['STATUS'] = "Suspended"
-        elif 'background:tomato' in page_source or 'style="background:tomato"' in page_source:
-            data['STATUS'] = "Unverified"
-        else:
-            try:
-                driver.find_element(By.CSS_SELECTOR, "div[style*='tomato']")
-                data['STATUS'] = "Unverified"
-            except:
-                data['STATUS'] = "Verified"
-        
-        data['FRIEND'] = get_friend_status(driver)
-        
-        # Intro
-        for sel in ["span.cl.sp.lsp.nos", "span.cl", ".ow span.nos"]:
-            try:
-                intro = driver.find_element(By.CSS_SELECTOR, sel)
-                if intro.text.strip():
-                    data['INTRO'] = clean_text(intro.text)
-                    break
-            except:
-                pass
-        
-        # Profile fields
-        fields = {'City:': 'CITY', 'Gender:': 'GENDER', 'Married:': 'MARRIED', 'Age:': 'AGE', 'Joined:': 'JOINED'}
-        for field_text, key in fields.items():
-            try:
-                elem = driver.find_element(By.XPATH, f"//b[contains(text(), '{field_text}')]/following-sibling::span[1]")
-                value = elem.text.strip()
-                if value:
-                    if key == 'JOINED':
-                        data[key] = convert_relative_date_to_absolute(value)
-                    elif key == 'GENDER':
-                        data[key] = "💃" if value.lower() == 'female' else "🕺" if value.lower() == 'male' else value
-                    elif key == 'MARRIED':
-                        if value.lower() in ['yes', 'married']:
-                            data[key] = "💍"
-                        elif value.lower() in ['no', 'single', 'unmarried']:
-                            data[key] = "❎"
-                        else:
-                            data[key] = value
-                    else:
-                        data[key] = clean_data(value)
-            except:
-                pass
-        
-        # Followers
-        for sel in ["span.cl.sp.clb", ".cl.sp.clb"]:
-            try:
-                followers = driver.find_element(By.CSS_SELECTOR, sel)
-                match = re.search(r'(\d+)', followers.text)
-                if match:
-                    data['FOLLOWERS'] = match.group(1)
-                    break
-            except:
-                pass
-        
-        # Posts count
-        for sel in ["a[href*='/profile/public/'] button div:first-child", "a[href*='/profile/public/'] button div"]:
-            try:
-                posts = driver.find_element(By.CSS_SELECTOR, sel)
-                match = re.search(r'(\d+)', posts.text)
-                if match:
-                    data['POSTS'] = match.group(1)
-                    break
-            except:
-                pass
-        
-        # Profile image
-        for sel in ["img[src*='avatar-imgs']", "img[src*='avatar']", "div[style*='whitesmoke'] img[src*='cloudfront.net']"]:
-            try:
-                img = driver.find_element(By.CSS_SELECTOR, sel)
-                src = img.get_attribute('src')
-                if src and ('avatar' in src or 'cloudfront.net' in src):
-                    src = src.replace('/thumbnail/', '/')
-                    data['IMAGE'] = src
-                    break
-            except:
-                pass
+        # One page_source round-trip, parsed locally
+        data.update(parse_profile_fields(driver.page_source, now))
         
-        # Recent post
-        if data['POSTS'] and data['POSTS'] != '0':
-            time.sleep(1)
-            post_data = scrape_recent_post(driver, nickname)
-            data['LAST POST'] = clean_data(post_data['LPOST'])
-            data['LAST POST TIME'] = post_data.get('LDATE-TIME', '')
+        fill_recent_post(data, lambda: scrape_recent_post(driver, nickname, now))
         
         log_msg(f"✅ Extracted: {data['GENDER']}, {data['CITY']}, Posts: {data['POSTS']}")
         return data
@@ -5,9 +5,26 @@ Google Sheets Manager - Optimized for append-only operations
 
 import time
 import json
+import re
+import random
+import threading
+from operator import ne
+from itertools import compress
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import gspread
 from core_scraper import *
 
+# At least 3 ASCII word/dot/dash characters, one of them a letter (ASCII like JavaScript's \w)
+_NICK_RE = re.compile(r'(?=.{3,})(?=.*[A-Za-z])[\w.-]+', re.ASCII)
+
+# Same check as _NICK_RE, run in the page so the list comes back in one call
+_ONLINE_NICKS_JS = r"""
+const re = /^(?=.{3,})(?=.*[A-Za-z])[\w.-]+$/;
+const nicks = Array.from(document.querySelectorAll('li.mbl.cl.sp b'), b => b.textContent.trim());
+return [...new Set(nicks.filter(n => re.test(n)))];
+"""
+
 class SheetsManager:
     def __init__(self):
         self.client = client
@@ -18,6 +35,13 @@ class SheetsManager:
         self.dashboard_sheet = None
         self.tags_mapping = {}
         self.existing_profiles = {}
+        self.writer = None
+        self._write_times = deque()
+        self._log_buffer = []
+        self._io = ThreadPoolExecutor(max_workers=1)
+        self.lock = threading.Lock()
+        self.target_rows = None
+        self.dashboard_header = None
     
     def setup(self):
         """Setup sheets"""
@@ -36,15 +60,8 @@ class SheetsManager:
             self.profiles_sheet = get_or_create_worksheet("Profiles", len(COLUMN_ORDER))
             self.target_sheet = get_or_create_worksheet("Target", 4)
             
-            # Initialize headers if sheet is empty
-            if not self.profiles_sheet.get_all_values():
-                self.profiles_sheet.append_row(COLUMN_ORDER)
-            if not self.target_sheet.get_all_values():
-                self.target_sheet.append_row(["Nickname", "Status", "Remarks", "Source"])
-            
             try:
                 self.tags_sheet = spreadsheet.worksheet("Tags")
-                self.load_tags_mapping()
             except gspread.exceptions.WorksheetNotFound:
                 self.tags_sheet = None
             
@@ -59,8 +76,29 @@ class SheetsManager:
             except gspread.exceptions.WorksheetNotFound:
                 self.dashboard_sheet = spreadsheet.add_worksheet(title=DASHBOARD_SHEET_NAME, rows=50, cols=8)
             
-            self.load_existing_profiles()
-            self.format_profiles_sheet()
+            # Read everything the run needs in one request; the results are cached for the run
+            ranges = [f"'{self.profiles_sheet.title}'", f"'{self.target_sheet.title}'", f"'{self.dashboard_sheet.title}'!1:1"]
+            if self.tags_sheet:
+                ranges.append(f"'{self.tags_sheet.title}'")
+            response = spreadsheet.values_batch_get(ranges)
+            sheet_values = [vr.get('values', []) for vr in response.get('valueRanges', [])]
+            profile_rows, self.target_rows, dashboard_rows = sheet_values[:3]
+            self.dashboard_header = dashboard_rows[0] if dashboard_rows else []
+            
+            # Initialize headers if sheet is empty
+            if not profile_rows:
+                self.profiles_sheet.append_row(COLUMN_ORDER)
+                profile_rows = [COLUMN_ORDER]
+            if not self.target_rows:
+                self.target_sheet.append_row(["Nickname", "Status", "Remarks", "Source"])
+                self.target_rows = [["Nickname", "Status", "Remarks", "Source"]]
+            
+            if self.tags_sheet:
+                self.load_tags_mapping(sheet_values[3])
+            
+            self.writer = SheetWriter(self.profiles_sheet)
+            self.load_existing_profiles(profile_rows)
+            self.format_profiles_sheet(profile_rows[0])
             
             return True
         
@@ -68,13 +106,51 @@ class SheetsManager:
             print(f"❌ Sheets setup failed: {e}")
             return False
     
-    def format_profiles_sheet(self):
-        """Format sheets without clearing data"""
+    def get_format_version(self):
+        """Format sentinel stored as developer metadata on the Profiles sheet"""
         try:
+            metadata = self.profiles_sheet.spreadsheet.fetch_sheet_metadata(
+                {'fields': 'sheets(properties.sheetId,developerMetadata)'}
+            )
+            for sheet in metadata.get('sheets', []):
+                if sheet['properties']['sheetId'] != self.profiles_sheet.id:
+                    continue
+                for entry in sheet.get('developerMetadata', []):
+                    if entry.get('metadataKey') == FORMAT_METADATA_KEY:
+                        return entry.get('metadataValue')
+        except Exception as e:
+            log_msg(f"⚠️ Format sentinel check failed: {e}")
+        return None
+    
+    def set_format_version(self, stale=False):
+        """Store the current format sentinel, replacing an outdated one"""
+        requests = []
+        if stale:
+            requests.append({"deleteDeveloperMetadata": {"dataFilter": {
+                "developerMetadataLookup": {"metadataKey": FORMAT_METADATA_KEY}
+            }}})
+        requests.append({"createDeveloperMetadata": {"developerMetadata": {
+            "metadataKey": FORMAT_METADATA_KEY,
+            "metadataValue": FORMAT_VERSION,
+            "location": {"sheetId": self.profiles_sheet.id},
+            "visibility": "DOCUMENT"
+        }}})
+        self.safe_update(self.profiles_sheet.spreadsheet.batch_update, {"requests": requests})
+    
+    def format_profiles_sheet(self, header=None):
+        """Format sheets without clearing data, skipped when already formatted"""
+        try:
+            version = self.get_format_version()
+            if header == COLUMN_ORDER and version == FORMAT_VERSION:
+                log_msg("🎨 Profiles sheet already formatted")
+                return
+            
+            last_col = column_letter(len(COLUMN_ORDER) - 1)
+            
             # Apply formatting to entire sheet
-            self.safe_update(
+            sheet_done = self.safe_update(
                 self.profiles_sheet.format,
-                "A:R",
+                f"A:{last_col}",
                 {
                     "backgroundColor": {"red": 1, "green": 1, "blue": 1},
                     "textFormat": {"fontFamily": "Bona Nova SC", "fontSize": 8}
@@ -82,42 +158,45 @@ class SheetsManager:
             )
             
             # Format header row
-            self.safe_update(
+            header_done = self.safe_update(
                 self.profiles_sheet.format,
-                "A1:R1",
+                f"A1:{last_col}1",
                 {
                     "textFormat": {"bold": True, "fontSize": 9, "fontFamily": "Bona Nova SC"},
                     "horizontalAlignment": "CENTER"
                 }
             )
+            
+            if sheet_done and header_done:
+                self.set_format_version(stale=version is not None)
         except Exception as e:
             log_msg(f"⚠️ Formatting failed: {e}")
     
-    def load_tags_mapping(self):
+    def load_tags_mapping(self, all_data=None):
         """Load tags mapping"""
         try:
-            all_data = self.tags_sheet.get_all_values()
+            if all_data is None:
+                all_data = self.tags_sheet.get_all_values()
             if not all_data or len(all_data) < 2:
                 return
             
             headers = all_data[0]
+            rows = all_data[1:]
             
+            # Collect tags per nickname, joined once at the end
+            tags = defaultdict(list)
             for col_idx, tag_name in enumerate(headers):
-                if not tag_name or not tag_name.strip():
+                tag_name = tag_name.strip()
+                if not tag_name:
                     continue
                 
-                tag_name_clean = tag_name.strip()
-                
-                for row_idx in range(1, len(all_data)):
-                    if col_idx < len(all_data[row_idx]):
-                        nickname = all_data[row_idx][col_idx].strip()
+                for row in rows:
+                    if col_idx < len(row):
+                        nickname = row[col_idx].strip()
                         if nickname:
-                            nickname_lower = nickname.lower()
-                            if nickname_lower in self.tags_mapping:
-                                self.tags_mapping[nickname_lower] += f", {tag_name_clean}"
-                            else:
-                                self.tags_mapping[nickname_lower] = tag_name_clean
+                            tags[nickname.lower()].append(tag_name)
             
+            self.tags_mapping = {nickname: ", ".join(names) for nickname, names in tags.items()}
             log_msg(f"📋 Loaded {len(self.tags_mapping)} tags")
         except Exception as e:
             log_msg(f"⚠️ Tags loading failed: {e}")
@@ -126,16 +205,20 @@ class SheetsManager:
         """Get tags for nickname"""
         return self.tags_mapping.get(nickname.lower(), "")
     
-    def load_existing_profiles(self):
+    def load_existing_profiles(self, all_rows=None):
         """Load existing profiles for duplicate checking"""
         try:
-            self.existing_profiles = {}
-            rows = self.profiles_sheet.get_all_values()[1:]  # Skip header
-            for idx, row in enumerate(rows, start=2):
+            if all_rows is None:
+                all_rows = self.profiles_sheet.get_all_values()
+            existing_profiles = {}
+            rows = all_rows[1:]  # Skip header
+            for row in rows:
                 if row and len(row) > 1:
                     nickname = row[1].strip().lower()  # NICK NAME column
                     if nickname:
-                        self.existing_profiles[nickname] = {'row': idx, 'data': row}
+                        existing_profiles[nickname] = tuple(row)
+            with self.lock:
+                self.existing_profiles = existing_profiles
             log_msg(f"📋 Loaded {len(self.existing_profiles)} existing profiles")
         except Exception as e:
             log_msg(f"⚠️ Profile loading failed: {e}")
@@ -143,7 +226,9 @@ class SheetsManager:
     def get_target_nicknames(self):
         """Get target nicknames with Pending status"""
         try:
-            rows = self.target_sheet.get_all_values()[1:]  # Skip header
+            if self.target_rows is None:
+                self.target_rows = self.target_sheet.get_all_values()
+            rows = self.target_rows[1:]  # Skip header
             targets = []
             
             for idx, row in enumerate(rows, start=2):
@@ -173,27 +258,20 @@ class SheetsManager:
             driver.get("https://damadam.pk/online_kon/")
             time.sleep(2)
             
-            nicknames = []
-            list_items = driver.find_elements(By.CSS_SELECTOR, "li.mbl.cl.sp")
-            
-            for li in list_items:
-                try:
-                    bold_elem = li.find_element(By.TAG_NAME, "b")
-                    nick = bold_elem.text.strip()
-                    
-                    if nick and len(nick) >= 3 and not nick.isdigit() and any(c.isalpha() for c in nick):
-                        nicknames.append(nick)
-                except:
-                    continue
+            # Extract, validate and deduplicate in the browser
+            nicknames = driver.execute_script(_ONLINE_NICKS_JS) or []
             
             # Fallback method
             if not nicknames:
-                profile_links = driver.find_elements(By.CSS_SELECTOR, "a[href*='/users/']")
-                for link in profile_links:
-                    href = link.get_attribute('href')
+                seen = set()
+                hrefs = driver.execute_script(
+                    "return Array.from(document.querySelectorAll(\"a[href*='/users/']\"), a => a.href);"
+                ) or []
+                for href in hrefs:
                     if href and '/users/' in href:
                         nick = href.split('/users/')[-1].rstrip('/')
-                        if nick and len(nick) >= 3 and not nick.isdigit() and any(c.isalpha() for c in nick) and nick not in nicknames:
+                        if nick and nick not in seen and _NICK_RE.fullmatch(nick):
+                            seen.add(nick)
                             nicknames.append(nick)
             
             print(f"  ✅ Found {len(nicknames)} online users")
@@ -203,55 +281,94 @@ class SheetsManager:
             print(f"  ❌ Failed to get online users: {e}")
             return []
     
-    def safe_update(self, func, *args, max_retries=3, **kwargs):
-        """Safe update with retry logic"""
+    def wait_for_write_quota(self):
+        """Sleep only when the last 60s already used SHEET_WRITES_PER_MINUTE writes"""
+        now = time.monotonic()
+        while self._write_times and now - self._write_times[0] >= 60:
+            self._write_times.popleft()
+        if len(self._write_times) >= SHEET_WRITES_PER_MINUTE:
+            wait_time = 60 - (now - self._write_times[0])
+            log_msg(f"⏳ Write quota window full, waiting {wait_time:.1f}s...")
+            time.sleep(wait_time)
+            self._write_times.popleft()
+    
+    def safe_update(self, func, *args, max_retries=5, **kwargs):
+        """Safe update with truncated exponential backoff on quota/server errors"""
         for attempt in range(max_retries):
             try:
+                self.wait_for_write_quota()
                 result = func(*args, **kwargs)
-                time.sleep(SHEET_WRITE_DELAY)
+                self._write_times.append(time.monotonic())
                 return result
             except Exception as e:
-                if '429' in str(e) or 'quota' in str(e).lower():
-                    wait_time = (attempt + 1) * 5
-                    log_msg(f"⏳ Rate limited, waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    if attempt == max_retries - 1:
-                        log_msg(f"❌ Update failed after {max_retries} attempts: {e}")
+                # Other 4xx API errors will not succeed on retry; network errors might
+                if isinstance(e, gspread.exceptions.APIError):
+                    code = e.response.status_code
+                    if code != 429 and code < 500:
+                        log_msg(f"❌ Update failed: {e}")
                         return None
+                
+                if attempt == max_retries - 1:
+                    log_msg(f"❌ Update failed after {max_retries} attempts: {e}")
+                    return None
+                
+                wait_time = min(64, 2 ** attempt) + random.random()
+                log_msg(f"⏳ Retrying in {wait_time:.1f}s ({e})")
+                time.sleep(wait_time)
         return None
     
-    def update_target_status(self, row_num, status, remarks):
-        """Update target status"""
-        try:
-            self.safe_update(self.target_sheet.update, values=[[status]], range_name=f'B{row_num}')
-            self.safe_update(self.target_sheet.update, values=[[remarks]], range_name=f'C{row_num}')
-        except Exception as e:
-            log_msg(f"⚠️ Target status update failed: {e}")
-    
-    def apply_link_formulas(self, row_idx, data):
-        """Apply link formulas to specific cells"""
-        for col_name in LINK_COLUMNS:
-            value = data.get(col_name)
-            if not value:
-                continue
-            
-            col_idx = COLUMN_TO_INDEX[col_name]
-            cell = f"{column_letter(col_idx)}{row_idx}"
-            
-            if col_name == "IMAGE":
-                formula = f'=IMAGE("{value}", 4, 50, 50)'
-            elif col_name == "LAST POST":
-                formula = f'=HYPERLINK("{value}", "Post")'
+    def build_sheet_row(self, row_values, data):
+        """Row as written to the sheet: link formulas in place, other values kept literal"""
+        cells = []
+        for col, value in zip(COLUMN_ORDER, row_values):
+            link = data.get(col) if col in LINK_COLUMNS else None
+            if link:
+                cells.append(LINK_FORMULAS[col].format(link))
             else:
-                formula = f'=HYPERLINK("{value}", "Profile")'
-            
-            self.safe_update(
-                self.profiles_sheet.update,
-                values=[[formula]],
-                range_name=cell,
-                value_input_option='USER_ENTERED'
-            )
+                cells.append(quote_literal(value))
+        return cells
+    
+    def queue_profile_row(self, row_values, data):
+        """Queue a profile row, link formulas included, for appending"""
+        self.writer.queue_append(self.build_sheet_row(row_values, data))
+    
+    def run_io(self, func, *args):
+        """Run Sheets work on the single I/O thread, in submission order"""
+        if not self._io:
+            return func(*args)
+        return self._io.submit(func, *args)
+    
+    def queue_target_status(self, row_num, status, remarks):
+        """Queue a target status update for the next flush"""
+        self.run_io(
+            self.writer.queue_range,
+            f'B{row_num}:C{row_num}',
+            [[quote_literal(status), quote_literal(remarks)]],
+            self.target_sheet
+        )
+    
+    def _flush_writes(self):
+        if not self.writer or not len(self.writer):
+            return
+        # Each append/batch update is retried and quota-counted on its own
+        written = self.writer.flush(self.safe_update)
+        if written:
+            log_msg(f"📤 Wrote {written} queued rows/statuses")
+        if len(self.writer):
+            log_msg(f"⚠️ {len(self.writer)} rows/statuses kept for the next flush")
+    
+    def flush_writes(self):
+        """Write all queued profile rows and target statuses in one batch"""
+        return self.run_io(self._flush_writes)
+    
+    def close(self):
+        """Flush outstanding writes and logs, then wait for the I/O thread to finish"""
+        if not self._io:
+            return
+        io, self._io = self._io, None
+        io.submit(self._flush_writes)
+        io.submit(self._flush_logs)
+        io.shutdown(wait=True)
     
     def log_change(self, nickname, change_type, changed_fields, before=None, after=None):
         """Log changes to log sheet"""
@@ -261,26 +378,33 @@ class SheetsManager:
         try:
             timestamp = get_pkt_time().strftime("%d-%b-%y %I:%M %p")
             fields_text = ", ".join(changed_fields) if changed_fields else "-"
-            before_text = json.dumps(before or {}, ensure_ascii=False)[:500]  # Limit length
-            after_text = json.dumps(after or {}, ensure_ascii=False)[:500]   # Limit length
+            before_text = json.dumps(before, ensure_ascii=False, separators=(',', ':'))[:500] if before else "{}"  # Limit length
+            after_text = json.dumps(after, ensure_ascii=False, separators=(',', ':'))[:500] if after else "{}"      # Limit length
             
-            self.safe_update(
-                self.log_sheet.append_row,
-                [timestamp, nickname, change_type, fields_text, before_text, after_text]
-            )
+            self._log_buffer.append([timestamp, nickname, change_type, fields_text, before_text, after_text])
+            if len(self._log_buffer) >= LOG_BATCH_SIZE:
+                self._flush_logs()
         except Exception as e:
             log_msg(f"⚠️ Logging failed: {e}")
     
+    def _flush_logs(self):
+        if not self._log_buffer:
+            return
+        rows, self._log_buffer = self._log_buffer, []
+        self.safe_update(self.log_sheet.append_rows, rows, value_input_option='RAW')
+    
     def update_dashboard(self, metrics):
         """Update dashboard with run metrics"""
         if not self.dashboard_sheet:
             return
         
         try:
-            existing_data = self.dashboard_sheet.get_all_values()
+            if self.dashboard_header is None:
+                existing_data = self.dashboard_sheet.get_all_values()
+                self.dashboard_header = existing_data[0] if existing_data else []
             expected_headers = ["Run#", "Timestamp", "Profiles", "Success", "Failed", "New", "Updated", "Unchanged"]
             
-            if not existing_data or existing_data[0] != expected_headers:
+            if self.dashboard_header != expected_headers:
                 self.safe_update(self.dashboard_sheet.clear)
                 self.safe_update(self.dashboard_sheet.append_row, expected_headers)
                 self.safe_update(
@@ -291,6 +415,7 @@ class SheetsManager:
                         "horizontalAlignment": "CENTER"
                     }
                 )
+                self.dashboard_header = expected_headers
             
             row_data = [
                 metrics.get("Run Number", ""),
@@ -306,6 +431,10 @@ class SheetsManager:
         except Exception as e:
             log_msg(f"⚠️ Dashboard update failed: {e}")
     
+    def write_profile_async(self, data):
+        """Queue write_profile on the I/O thread, returns a future"""
+        return self.run_io(self.write_profile, data)
+    
     def write_profile(self, data):
         """Write profile data - APPEND ONLY, no row 2 insertion"""
         nickname = data.get("NICK NAME", "").strip()
@@ -317,58 +446,54 @@ class SheetsManager:
         
         # Prepare row values
         row_values = []
-        for col in COLUMN_ORDER:
+        for col, value in zip(COLUMN_ORDER, data.to_row()):
             if col == "IMAGE":
                 cell_value = ""  # Will be filled by formula
             elif col == "PROFILE LINK":
-                cell_value = "Profile" if data.get(col) else ""
+                cell_value = "Profile" if value else ""
             elif col == "LAST POST":
-                cell_value = "Post" if data.get(col) else ""
+                cell_value = "Post" if value else ""
             else:
-                cell_value = clean_data(data.get(col, ""))
+                cell_value = clean_data(value)
             row_values.append(cell_value)
         
         nickname_lower = nickname.lower()
-        existing = self.existing_profiles.get(nickname_lower)
+        with self.lock:
+            existing = self.existing_profiles.get(nickname_lower)
         
         if existing:
-            # Check for changes
-            before_snapshot = {
-                COLUMN_ORDER[idx]: (existing['data'][idx] if idx < len(existing['data']) else "")
-                for idx in range(len(COLUMN_ORDER))
-            }
-            
-            changed_indices = []
-            for idx, col in enumerate(COLUMN_ORDER):
-                old_val = before_snapshot.get(col, "") or ""
-                new_val = row_values[idx] or ""
-                if old_val != new_val:
-                    changed_indices.append(idx)
+            # Check for changes (short sheet rows are padded with blanks)
+            old_values = list(existing[:len(COLUMN_ORDER)])
+            old_values += [""] * (len(COLUMN_ORDER) - len(old_values))
+            if old_values == row_values:
+                changed_indices = []
+            else:
+                changed_indices = list(compress(range(len(COLUMN_ORDER)), map(ne, old_values, row_values)))
             
             if not changed_indices:
-                self.log_change(nickname, "UNCHANGED", [], before_snapshot, {col: data.get(col, "") for col in COLUMN_ORDER})
+                # Nothing changed, so the log row carries no snapshots
+                self.log_change(nickname, "UNCHANGED", [])
                 return {"status": "unchanged", "changed_fields": []}
             
             # Update existing profile by appending new data
-            self.safe_update(self.profiles_sheet.append_row, row_values)
-            new_row = len(self.profiles_sheet.get_all_values())
-            self.apply_link_formulas(new_row, data)
+            self.queue_profile_row(row_values, data)
             
             changed_fields = [COLUMN_ORDER[idx] for idx in changed_indices]
+            before_snapshot = dict(zip(COLUMN_ORDER, old_values))
             self.log_change(nickname, "UPDATED", changed_fields, before_snapshot, {col: data.get(col, "") for col in COLUMN_ORDER})
             
             # Update our cache
-            self.existing_profiles[nickname_lower] = {'row': new_row, 'data': row_values}
+            with self.lock:
+                self.existing_profiles[nickname_lower] = tuple(row_values)
             
             return {"status": "updated", "changed_fields": changed_fields}
         else:
             # New profile - append to end
-            self.safe_update(self.profiles_sheet.append_row, row_values)
-            new_row = len(self.profiles_sheet.get_all_values())
-            self.apply_link_formulas(new_row, data)
+            self.queue_profile_row(row_values, data)
             
             # Add to cache
-            self.existing_profiles[nickname_lower] = {'row': new_row, 'data': row_values}
+            with self.lock:
+                self.existing_profiles[nickname_lower] = tuple(row_values)
             
             changed_fields = list(COLUMN_ORDER)
             self.log_change(nickname, "NEW", changed_fields, None, {col: data.get(col, "") for col in COLUMN_ORDER})
@@ -8,11 +8,11 @@ Marks complete when done
 
 import sys
 import time
-import random
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from core_scraper import *
-from browser_auth import setup_browser, restart_browser, login_to_damadam
-from profile_scraper import scrape_profile
+from browser_auth import DriverPool
+from profile_scraper import scrape_profile, scrape_profile_http
 from sheets_manager import SheetsManager
 
 def main():
@@ -23,21 +23,14 @@ def main():
     print("⏰ Scheduled: Every 58 minutes")
     print("="*60)
     
-    driver = setup_browser()
-    if not driver:
-        print("\n❌ Browser setup failed")
-        sys.exit(1)
+    pool = None
+    executor = None
+    sheets = None
     
     try:
-        if not login_to_damadam(driver):
-            print("\n❌ Login failed")
-            driver.quit()
-            sys.exit(1)
-        
         sheets = SheetsManager()
         if not sheets.setup():
             print("\n❌ Sheets setup failed")
-            driver.quit()
             sys.exit(1)
         
         # Get pending targets only
@@ -46,43 +39,60 @@ def main():
         if not targets:
             print("\n⚠️ No pending targets found")
             print("✅ All targets completed or no targets in Target sheet")
-            driver.quit()
             return
         
-        print(f"\n🚀 Processing {len(targets)} pending targets...")
+        pool = DriverPool(min(DRIVER_POOL_SIZE, len(targets)))
+        if not pool.start():
+            print("\n❌ Browser setup or login failed")
+            sys.exit(1)
+        
+        # One MIN_DELAY..MAX_DELAY gap between site requests across all workers,
+        # plus the 5s pause every BATCH_SIZE profiles
+        pacer = RequestPacer()
+        
+        def scrape_target(target):
+            """Scrape a target over HTTP, falling back to a pooled browser"""
+            nickname = target['nickname']
+            session = pool.http_session
+            pacer.wait(new_profile=True)
+            if session:
+                profile = scrape_profile_http(session, nickname)
+                if profile:
+                    return profile
+            
+            driver = pool.acquire()
+            if not driver:
+                return None
+            try:
+                # The HTTP attempt used this profile's turn, the page load needs another
+                if session:
+                    pacer.wait()
+                profile = scrape_profile(driver, nickname)
+                if profile is None:
+                    driver = pool.restart(driver)
+                    if driver:
+                        pacer.wait()
+                        profile = scrape_profile(driver, nickname)
+                return profile
+            finally:
+                pool.release(driver)
+        
+        print(f"\n🚀 Processing {len(targets)} pending targets with {pool.size} workers...")
         print("-"*60)
         
         success = failed = 0
-        run_stats = defaultdict(int)
-        status_counts = defaultdict(int)
+        run_stats = Counter()
+        status_counts = Counter()
         start_time = time.time()
         
-        for i, target in enumerate(targets, 1):
+        def record_result(target, profile, write_future):
+            """Count a finished write and queue the target's status"""
+            nonlocal success, failed
             nickname = target['nickname']
             row_num = target.get('row', 0)
-            source = target.get('source', 'Target')
-            
-            eta = calculate_eta(i-1, len(targets), start_time)
-            print(f"\n[{i}/{len(targets)}] {nickname} (Target Row {row_num}) | ETA: {eta}")
-            
-            # Update status to "Processing"
-            if row_num > 0:
-                sheets.update_target_status(row_num, "🔄 Processing", f"Started @ {get_pkt_time().strftime('%I:%M %p')}")
-            
-            profile = None
-            for attempt in range(2):
-                profile = scrape_profile(driver, nickname)
-                if profile is None and attempt == 0:
-                    driver = restart_browser(driver)
-                    if driver and login_to_damadam(driver):
-                        continue
-                    else:
-                        break
-                break
             
             if profile:
-                profile['SOURCE'] = source
-                write_result = sheets.write_profile(profile)
+                write_result = write_future.result()
                 
                 if write_result.get("status") in {"new", "updated", "unchanged"}:
                     success += 1
@@ -109,28 +119,50 @@ def main():
                     
                     # Mark as completed
                     if row_num > 0:
-                        sheets.update_target_status(row_num, "✅ Completed", remark)
+                        sheets.queue_target_status(row_num, "✅ Completed", remark)
                     
                     log_msg(f"✅ {nickname} {write_result['status']} -> Marked Complete")
                 else:
                     failed += 1
                     error_msg = write_result.get("error", "Write failed")
                     if row_num > 0:
-                        sheets.update_target_status(row_num, "❌ Failed", f"Error: {error_msg} @ {get_pkt_time().strftime('%I:%M %p')}")
+                        sheets.queue_target_status(row_num, "❌ Failed", f"Error: {error_msg} @ {get_pkt_time().strftime('%I:%M %p')}")
                     log_msg(f"❌ {nickname} failed: {error_msg}")
             else:
                 failed += 1
                 if row_num > 0:
-                    sheets.update_target_status(row_num, "❌ Failed", f"Scrape error @ {get_pkt_time().strftime('%I:%M %p')}")
+                    sheets.queue_target_status(row_num, "❌ Failed", f"Scrape error @ {get_pkt_time().strftime('%I:%M %p')}")
                 log_msg(f"❌ {nickname} scraping failed")
+        
+        executor = ThreadPoolExecutor(max_workers=pool.size)
+        results = executor.map(scrape_target, targets)
+        pending = None
+        
+        for i, (target, profile) in enumerate(zip(targets, results), 1):
+            nickname = target['nickname']
+            row_num = target.get('row', 0)
+            source = target.get('source', 'Target')
             
-            # Batch delay
-            if BATCH_SIZE > 0 and i % BATCH_SIZE == 0 and i < len(targets):
-                log_msg(f"⏸️ Batch pause (processed {i}/{len(targets)})")
-                time.sleep(5)
+            eta = calculate_eta(i, len(targets), start_time)
+            print(f"\n[{i}/{len(targets)}] {nickname} (Target Row {row_num}) | ETA: {eta}")
             
-            # Random delay between profiles
-            time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
+            # Sheets I/O for this profile overlaps with waiting on the next scrape
+            write_future = None
+            if profile:
+                profile['SOURCE'] = source
+                write_future = sheets.write_profile_async(profile)
+            
+            if pending:
+                record_result(*pending)
+            pending = (target, profile, write_future)
+            
+            # Batched profile and target status writes
+            if BATCH_SIZE > 0 and i % BATCH_SIZE == 0:
+                sheets.flush_writes()
+        
+        if pending:
+            record_result(*pending)
+        sheets.close()
         
         # Final summary
         print("\n" + "="*60)
@@ -147,7 +179,7 @@ def main():
         # Status breakdown
         if status_counts:
             print(f"\n📊 Status Breakdown:")
-            for status, count in status_counts.items():
+            for status, count in status_counts.most_common():
                 print(f"   {status}: {count}")
         
         print(f"\n🎯 Completed targets marked in Target sheet")
@@ -160,9 +192,9 @@ def main():
             "Profiles Processed": len(targets),
             "Success": success,
             "Failed": failed,
-            "New Profiles": run_stats.get('new', 0),
-            "Updated Profiles": run_stats.get('updated', 0),
-            "Unchanged Profiles": run_stats.get('unchanged', 0)
+            "New Profiles": run_stats['new'],
+            "Updated Profiles": run_stats['updated'],
+            "Unchanged Profiles": run_stats['unchanged']
         }
         sheets.update_dashboard(metrics)
         
@@ -175,11 +207,13 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
-        try:
-            driver.quit()
-            print("🔒 Browser closed")
-        except:
-            pass
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if sheets:
+            sheets.close()
+        if pool:
+            pool.close()
+            print("🔒 Browsers closed")
 
 if __name__ == "__main__":
     main()